@@ -22,9 +22,15 @@ from .device_support import Implementation, MethodMetadata, sort_executers
 from .device_sync_support import (
     discover_files_dirs,
     generate_dst_dirs,
+    load_hash_cache,
+    mpy_cross_identity,
+    parse_hashes,
     preprocess_ignore,
     preprocess_keep,
+    preprocess_src_file,
     preprocess_src_file_hash,
+    prune_mpy_cache,
+    save_hash_cache,
 )
 from .exceptions import (
     ConnectionLost,
@@ -121,11 +127,10 @@ class Device(metaclass=DeviceMeta):
 
         self._connect_to_board(**self._board_kwargs)
 
-        self._exec_snippet("startup")
-
         # Obtain implementation early on so implementation-specific executers can be bound.
+        # The startup snippet reports it, saving a separate round-trip.
         self.implementation = Implementation(
-            *self("(sys.implementation.name, sys.implementation.version, sys.platform)"),
+            *self._exec_snippet("startup"),
             emitters=self._emitter_check(),
         )
 
@@ -201,7 +206,8 @@ class Device(metaclass=DeviceMeta):
         pass
 
     def _emitter_check(self):
-        # Detect which emitters are available
+        # Detect which emitters are available.
+        # The snippet cleans up after itself, so detection is a single round-trip.
         emitters = []
         try:
             self._exec_snippet("emitter_check")
@@ -223,25 +229,33 @@ class Device(metaclass=DeviceMeta):
         else:
             emitters.append("native")
             emitters.append("viper")
-            self("del __belay_emitter_test")
 
         return tuple(emitters)
 
     def _connect_to_board(self, **kwargs):
         self._board = Pyboard(**kwargs)
+        # Names of snippets whose definitions are currently loaded on-device.
+        self._loaded_snippets = set()
         soft_reset = not isinstance(self._board.serial, WebreplToSerial)
         self._board.enter_raw_repl(soft_reset=soft_reset)
 
     def _exec_snippet(self, *names: str) -> BelayReturn:
         """Load and execute a snippet from the snippets sub-package.
 
+        Snippets that have already been loaded this session are not re-sent.
+
         Parameters
         ----------
         names : str
             Snippet(s) to load and execute.
         """
+        names = [name for name in names if name not in self._loaded_snippets]
+        if not names:
+            return None
         snippets = [read_snippet(name) for name in names]
-        return self("\n".join(snippets))
+        out = self("\n".join(snippets))
+        self._loaded_snippets.update(names)
+        return out
 
     def __call__(
         self,
@@ -338,6 +352,9 @@ class Device(metaclass=DeviceMeta):
         If a file/folder exists on the remote filesystem that doesn't exist in the local
         folder, then delete it (unless it's in ``keep``).
 
+        Local file hashes are cached in Belay's cache folder, so unchanged files
+        are not re-processed on subsequent syncs.
+
         Parameters
         ----------
         folder: str, Path
@@ -360,6 +377,11 @@ class Device(metaclass=DeviceMeta):
             Path to mpy-cross binary. If provided, ``.py`` will automatically
             be compiled.
             Takes precedence over minifying.
+            Compiled files record their path relative to ``folder`` (e.g. ``lib/foo.py``)
+            as the filename shown in on-device tracebacks. Since this name is part of the
+            compiled output, files compiled under a different name (e.g. by older versions
+            of Belay, which used the local path) are re-uploaded once.
+            Compiled output is cached in Belay's cache folder.
         progress_update:
             Partial for ``rich.progress.Progress.update(task_id,...)`` to update with sync status.
         """
@@ -409,10 +431,8 @@ class Device(metaclass=DeviceMeta):
         dst_files = [dst_file.as_posix() for dst_file in dst_files]
         dst_dirs = generate_dst_dirs(dst, folder, src_dirs)
 
-        if keep_all:
-            self("del __belay_del_fs")
-        else:
-            self(f"__belay_del_fs({repr(dst)}, {repr(set(keep + dst_files))}); del __belay_del_fs")
+        if not keep_all:
+            self(f"__belay_del_fs({repr(dst)}, {repr(set(keep + dst_files))})")
 
         # Try and make all remote dirs
         if dst_dirs:
@@ -423,33 +443,56 @@ class Device(metaclass=DeviceMeta):
         with TemporaryDirectory() as tmp_dir, concurrent.futures.ThreadPoolExecutor() as executor:
             tmp_dir = Path(tmp_dir)
 
+            hash_cache = load_hash_cache(folder)
+            src_root = folder if folder.is_dir() else folder.parent
+            mpy_cross_id = mpy_cross_identity(mpy_cross_binary) if mpy_cross_binary else None
+
             def _preprocess_src_file_hash_helper(src_file):
-                return preprocess_src_file_hash(tmp_dir, src_file, minify, mpy_cross_binary)
+                source_name = src_file.relative_to(src_root).as_posix()
+                return preprocess_src_file_hash(
+                    tmp_dir, src_file, minify, mpy_cross_binary, hash_cache, source_name, mpy_cross_id
+                )
 
             src_files_and_hashes = executor.map(_preprocess_src_file_hash_helper, src_files)
 
             # Get all remote hashes
             if progress_update:
                 progress_update(description="Fetching remote hashes...")
-            dst_hashes = self(f"__belay_hfs({repr(dst_files)})")
+            dst_hashes = parse_hashes(self(f"__belay_hfs({repr(dst_files)})"))
 
             if len(dst_hashes) != len(dst_files):
                 raise InternalError
 
             puts = []
-            for (src_file, src_hash), dst_file, dst_hash in zip(src_files_and_hashes, dst_files, dst_hashes):
+            for src_file, (preprocessed_file, src_hash), dst_file, dst_hash in zip(
+                src_files, src_files_and_hashes, dst_files, dst_hashes
+            ):
                 if src_hash != dst_hash:
-                    puts.append((src_file, dst_file))
+                    if preprocessed_file is None:
+                        # Hash was cached; the file still needs to be preprocessed for transfer.
+                        preprocessed_file = preprocess_src_file(
+                            tmp_dir,
+                            src_file,
+                            minify,
+                            mpy_cross_binary,
+                            src_file.relative_to(src_root).as_posix(),
+                            mpy_cross_id,
+                        )
+                    puts.append((preprocessed_file, dst_file))
+
+            save_hash_cache(folder, hash_cache)
+            if mpy_cross_binary:
+                prune_mpy_cache()
 
             if progress_update:
                 progress_update(total=len(puts))
 
-            for src_file, dst_file in puts:
-                if progress_update:
-                    progress_update(description=f"Pushing: {dst_file[1:]}")
-                self._board.fs_put(src_file, dst_file)
-                if progress_update:
-                    progress_update(advance=1)
+            def _progress_callback(n_completed, dst_file):
+                progress_update(completed=n_completed, description=f"Pushing: {dst_file[1:]}")
+
+            self._board.fs_put_many(puts, progress_callback=_progress_callback if progress_update else None)
+            if progress_update:
+                progress_update(completed=len(puts))
 
     def sync_dependencies(
         self,
@@ -774,9 +817,12 @@ class Device(metaclass=DeviceMeta):
         with contextlib.suppress(KeyboardInterrupt):
             miniterm.join(True)
         miniterm.join()
+        # Arbitrary user input may have modified the on-device global namespace.
+        self._loaded_snippets.clear()
 
     def soft_reset(self):
         """Reset device, executing ``main.py`` if available."""
+        self._loaded_snippets.clear()
         # When in Raw REPL, ctrl-d will perform a reset, but won't execute ``main.py``
         # https://github.com/micropython/micropython/issues/2249
         self._board.exit_raw_repl()
@@ -1,38 +1,89 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
 import subprocess
+import tempfile
+import time
 from pathlib import Path
-from typing import Optional, Union
+from typing import Callable, List, Optional, Tuple, Union
 
 from pathspec import PathSpec
-from pathspec.util import append_dir_sep
+from pathspec.util import normalize_file
 
 from ._minify import minify as minify_code
 from .hash import fnv1a
 from .typing import PathType
 
+log = logging.getLogger(__name__)
+
+_named_group_pattern = re.compile(r"\(\?P<\w+>")
+
+# Cached ``.mpy`` files and sync hash caches that haven't been used for this long are evicted.
+_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+
+
+def _compile_ignore(ignore: list) -> Callable[[str], bool]:
+    """Compile gitwildmatch ``ignore`` patterns into a single path predicate.
+
+    If no pattern is a negation (``!pattern``), a path is ignored if *any* pattern
+    matches, so all patterns are merged into one regex alternation and each path is
+    tested once. Otherwise, ``PathSpec.match_file`` is used to respect pattern order.
+    """
+    ignore_spec = PathSpec.from_lines("gitwildmatch", ignore)
+    patterns = [pattern for pattern in ignore_spec.patterns if pattern.include is not None]
+    if not patterns:
+        return lambda path: False
+    if not all(pattern.include for pattern in patterns):
+        return ignore_spec.match_file
+
+    # Named groups can't be repeated within a single regex; they're unused here anyways.
+    union = re.compile(
+        "|".join(f"(?:{_named_group_pattern.sub('(?:', pattern.regex.pattern)})" for pattern in patterns)
+    )
+    return lambda path: union.match(normalize_file(path)) is not None
+
+
+def _walk_files_dirs(
+    folder: str,
+    is_ignored: Callable[[str], bool],
+    src_files: List[str],
+    src_dirs: List[str],
+) -> None:
+    """Recursively populate ``src_files`` and ``src_dirs`` with non-ignored paths.
+
+    Ignored directories are not descended into.
+    """
+    with os.scandir(folder) as it:
+        for entry in it:
+            # ``DirEntry.is_dir`` is usually answered without an additional stat syscall.
+            is_dir = entry.is_dir()
+            if is_ignored(entry.path + os.sep if is_dir else entry.path):
+                continue
+            if is_dir:
+                src_dirs.append(entry.path)
+                if not entry.is_symlink():
+                    _walk_files_dirs(entry.path, is_ignored, src_files, src_dirs)
+            else:
+                src_files.append(entry.path)
+
 
 def discover_files_dirs(
     remote_dir: str,
     local_file_or_folder: Path,
     ignore: Optional[list] = None,
 ):
-    src_objects = []
     if local_file_or_folder.is_dir():
         if ignore is None:
             ignore = []
-        ignore_spec = PathSpec.from_lines("gitwildmatch", ignore)
-        for src_object in local_file_or_folder.rglob("*"):
-            if ignore_spec.match_file(append_dir_sep(src_object)):
-                continue
-            src_objects.append(src_object)
-        # Sort so that folder creation comes before file sending.
-        src_objects.sort()
+        src_files_str, src_dirs_str = [], []
+        _walk_files_dirs(str(local_file_or_folder), _compile_ignore(ignore), src_files_str, src_dirs_str)
 
-        src_files, src_dirs = [], []
-        for src_object in src_objects:
-            if src_object.is_dir():
-                src_dirs.append(src_object)
-            else:
-                src_files.append(src_object)
+        # Sort so that folder creation comes before file sending.
+        src_files = sorted(map(Path, src_files_str))
+        src_dirs = sorted(map(Path, src_dirs_str))
         dst_files = [remote_dir / src.relative_to(local_file_or_folder) for src in src_files]
     else:
         src_files = [local_file_or_folder]
@@ -77,7 +128,19 @@ def preprocess_src_file(
     src_file: PathType,
     minify: bool,
     mpy_cross_binary: Union[str, Path, None],
+    source_name: Optional[str] = None,
+    mpy_cross_id: Optional[str] = None,
 ) -> Path:
+    """Preprocess ``src_file`` for transfer.
+
+    Parameters
+    ----------
+    source_name: Optional[str]
+        Source filename embedded in ``mpy-cross`` output for tracebacks.
+        Defaults to ``src_file``.
+    mpy_cross_id: Optional[str]
+        Precomputed ``mpy_cross_identity(mpy_cross_binary)``.
+    """
     tmp_dir = Path(tmp_dir)
     src_file = Path(src_file)
 
@@ -87,7 +150,9 @@ def preprocess_src_file(
     if src_file.suffix == ".py":
         if mpy_cross_binary:
             transformed = transformed.with_suffix(".mpy")
-            subprocess.check_output([mpy_cross_binary, "-o", transformed, src_file])  # nosec
+            if mpy_cross_id is None:
+                mpy_cross_id = mpy_cross_identity(mpy_cross_binary)
+            _mpy_cross(mpy_cross_binary, mpy_cross_id, src_file, transformed, source_name or src_file.as_posix())
             return transformed
         elif minify:
             minified = minify_code(src_file.read_text())
@@ -97,14 +162,237 @@ def preprocess_src_file(
     return src_file
 
 
-def preprocess_src_file_hash(*args, **kwargs):
-    src_file = preprocess_src_file(*args, **kwargs)
+def _write_bytes_atomic(path: Path, data: bytes) -> None:
+    """Write ``data`` to ``path`` such that readers never observe a partially written file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        Path(tmp).replace(path)
+    except BaseException:
+        Path(tmp).unlink()
+        raise
+
+
+def _mpy_cache_folder() -> Path:
+    from .project import find_cache_folder
+
+    return find_cache_folder() / "mpy-cross"
+
+
+def mpy_cross_identity(mpy_cross_binary: Union[str, Path]) -> str:
+    """Identify the ``mpy-cross`` binary by its resolved path, modification time, and size."""
+    binary = shutil.which(mpy_cross_binary) or str(mpy_cross_binary)
+    try:
+        stat = Path(binary).stat()
+    except OSError:
+        return binary
+    return f"{binary}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def _mpy_cache_file(mpy_cross_id: str, src_file: Path, source_name: str) -> Path:
+    """Path to the cached ``mpy-cross`` output of ``src_file``.
+
+    Keyed on the source contents, the source name embedded in the ``.mpy`` for tracebacks,
+    and the identity of the ``mpy-cross`` binary.
+    """
+    digest = hashlib.blake2b(src_file.read_bytes(), digest_size=16)
+    digest.update(b"\0" + source_name.encode())
+    digest.update(b"\0" + mpy_cross_id.encode())
+    return _mpy_cache_folder() / f"{digest.hexdigest()}.mpy"
+
+
+def _mpy_cross(
+    mpy_cross_binary: Union[str, Path], mpy_cross_id: str, src_file: Path, dst_file: Path, source_name: str
+) -> None:
+    """Compile ``src_file`` to ``dst_file``, reusing previously compiled output when available.
+
+    The cache is best-effort; failing to write to it doesn't fail the compilation.
+    """
+    try:
+        cache_file = _mpy_cache_file(mpy_cross_id, src_file, source_name)
+    except OSError:
+        # Let mpy-cross report the unreadable file.
+        cache_file = None
+
+    if cache_file is not None:
+        try:
+            shutil.copyfile(cache_file, dst_file)
+            # Mark as recently used so ``prune_mpy_cache`` keeps it.
+            os.utime(cache_file)
+        except OSError:
+            pass
+        else:
+            return
+
+    subprocess.check_output([mpy_cross_binary, "-o", dst_file, "-s", source_name, src_file])  # nosec
+
+    if cache_file is not None and dst_file.exists():
+        try:
+            _write_bytes_atomic(cache_file, dst_file.read_bytes())
+        except OSError as e:
+            log.warning("Unable to cache mpy-cross output in %s: %s", cache_file.parent, e)
+
+
+def _prune_cache_folder(folder: Path, max_age: float) -> None:
+    """Best-effort deletion of files in ``folder`` that haven't been modified in ``max_age`` seconds."""
+    cutoff = time.time() - max_age
+    try:
+        it = os.scandir(folder)
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        log.warning("Unable to prune cache folder %s: %s", folder, e)
+        return
+    with it:
+        for entry in it:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    Path(entry.path).unlink()
+            except FileNotFoundError:
+                # Concurrently pruned.
+                pass
+            except OSError as e:
+                log.warning("Unable to prune cache file %s: %s", entry.path, e)
+
+
+def prune_mpy_cache(max_age: float = _CACHE_MAX_AGE) -> None:
+    """Delete cached ``mpy-cross`` output that hasn't been used in ``max_age`` seconds."""
+    _prune_cache_folder(_mpy_cache_folder(), max_age)
+
+
+def _hash_cache_path(folder: Path) -> Path:
+    from .project import find_cache_folder
+
+    digest = hashlib.blake2b(str(folder).encode(), digest_size=16)
+    return find_cache_folder() / "sync-hashes" / f"{digest.hexdigest()}.json"
+
+
+def _is_temporary(folder: Path) -> bool:
+    """If ``folder`` is within the system temporary directory."""
+    try:
+        folder.relative_to(Path(tempfile.gettempdir()).resolve())
+    except ValueError:
+        return False
+    return True
+
+
+def load_hash_cache(folder: Path) -> Optional[dict]:
+    """Load the on-disk cache of preprocessed local file hashes for sync root ``folder``.
+
+    The cache is structured as ``{"written_ns": int, "files": {src_file: {preprocess_mode: [mtime_ns, size, hash]}}}``,
+    where ``written_ns`` is when the cache was last saved.
+
+    Returns ``None`` if the cache shouldn't be used: ``folder`` is temporary (e.g. from ``belay install``),
+    so its cache could never be hit, or the cache folder is unusable.
+    """
+    if _is_temporary(folder):
+        return None
+    path = _hash_cache_path(folder)
+    try:
+        written_ns = path.stat().st_mtime_ns
+        files = json.loads(path.read_text())
+    except FileNotFoundError:
+        written_ns, files = 0, {}
+    except OSError as e:
+        log.warning("Unable to load sync hash cache %s; syncing without it: %s", path, e)
+        return None
+    except ValueError:
+        # Corrupt; overwritten on save.
+        files = {}
+    if not isinstance(files, dict):
+        files = {}
+    return {"written_ns": written_ns, "files": files}
+
+
+def save_hash_cache(folder: Path, hash_cache: Optional[dict]) -> None:
+    """Save ``hash_cache`` for sync root ``folder`` to disk, dropping entries for files that no longer exist.
+
+    Caches of sync roots that haven't been synced recently are deleted.
+    Failures are logged rather than raised; the cache is only an optimization.
+    """
+    if hash_cache is None:
+        return
+    files = hash_cache["files"]
+    for src_file in [x for x in files if not Path(x).exists()]:
+        del files[src_file]
+    path = _hash_cache_path(folder)
+    try:
+        _write_bytes_atomic(path, json.dumps(files).encode())
+    except OSError as e:
+        log.warning("Unable to save sync hash cache %s: %s", path, e)
+        return
+    _prune_cache_folder(path.parent, _CACHE_MAX_AGE)
+
+
+def preprocess_src_file_hash(
+    tmp_dir: PathType,
+    src_file: PathType,
+    minify: bool,
+    mpy_cross_binary: Union[str, Path, None],
+    hash_cache: Optional[dict] = None,
+    source_name: Optional[str] = None,
+    mpy_cross_id: Optional[str] = None,
+) -> Tuple[Optional[Path], int]:
+    """Preprocess and hash ``src_file``.
+
+    Parameters
+    ----------
+    hash_cache: Optional[dict]
+        Cache from ``load_hash_cache``.
+        If it contains an up-to-date hash for ``src_file``, preprocessing is skipped
+        and ``None`` is returned in place of the preprocessed file.
+    source_name: Optional[str]
+        See ``preprocess_src_file``.
+    mpy_cross_id: Optional[str]
+        See ``preprocess_src_file``.
+
+    Returns
+    -------
+    src_file: Optional[Path]
+        Preprocessed file.
+    src_hash: int
+        FNV-1a hash of the preprocessed file.
+    """
+    if hash_cache is None:
+        src_file = preprocess_src_file(tmp_dir, src_file, minify, mpy_cross_binary, source_name, mpy_cross_id)
+        return src_file, fnv1a(src_file)
+
+    if mpy_cross_binary and mpy_cross_id is None:
+        mpy_cross_id = mpy_cross_identity(mpy_cross_binary)
+
+    stat = Path(src_file).stat()
+    mode = f"{minify:d}{mpy_cross_id or ''}"
+    files = hash_cache["files"]
+    file_cache = files.get(str(src_file))
+    if not isinstance(file_cache, dict):
+        file_cache = files[str(src_file)] = {}
+    entry = file_cache.get(mode)
+    # Malformed entries (e.g. a hand-edited cache file) are treated as a miss.
+    if isinstance(entry, list) and len(entry) == 3 and isinstance(entry[2], int):
+        mtime_ns, size, src_hash = entry
+        # Like git's "racy" check: a file modified no earlier than the cache was written may have
+        # changed again within the same timestamp granularity, so its entry can't be trusted.
+        if mtime_ns == stat.st_mtime_ns and size == stat.st_size and mtime_ns < hash_cache["written_ns"]:
+            return None, src_hash
+
+    src_file = preprocess_src_file(tmp_dir, src_file, minify, mpy_cross_binary, source_name, mpy_cross_id)
     src_hash = fnv1a(src_file)
+    file_cache[mode] = [stat.st_mtime_ns, stat.st_size, src_hash]
     return src_file, src_hash
 
 
+def parse_hashes(packed: str) -> List[int]:
+    """Unpack the fixed-width hexadecimal hashes returned by on-device ``__belay_hfs``."""
+    return [int(packed[i : i + 8], 16) for i in range(0, len(packed), 8)]
+
+
 def generate_dst_dirs(dst, src, src_dirs) -> list:
-    dst_dirs = [(dst / x.relative_to(src)).as_posix() for x in src_dirs]
+    # Plain string slicing; avoids allocating intermediate ``Path`` objects per directory.
+    src_prefix_len = len(src.as_posix().rstrip("/")) + 1
+    dst_base = dst.rstrip("/")
+    dst_dirs = [f"{dst_base}/{x.as_posix()[src_prefix_len:]}" for x in src_dirs]
     # Add all directories leading up to ``dst``.
     dst_prefix_tokens = dst.split("/")
     for i in range(2, len(dst_prefix_tokens) + (dst[-1] != "/")):
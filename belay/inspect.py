@@ -1,7 +1,9 @@
 import ast
 import inspect
-import re
+import linecache
+import weakref
 from io import StringIO
+from pathlib import Path
 from tokenize import (
     COMMENT,
     DEDENT,
@@ -12,9 +14,34 @@ from tokenize import (
     generate_tokens,
     untokenize,
 )
-from typing import Tuple
+from types import CodeType
+from typing import Callable, Dict, List, Tuple
 
-_pat_no_decorators = re.compile(r"^(\s*def\s)|(\s*async\s+def\s)|(.*(?<!\w)lambda(:|\s))")
+
+def _contains_lambda(line: str) -> bool:
+    """Check if the first line of ``line`` contains a ``lambda`` keyword."""
+    first_line = line.partition("\n")[0]
+    i = first_line.find("lambda")
+    while i >= 0:
+        before = first_line[i - 1 : i]
+        after = line[i + 6 : i + 7]
+        if not (before.isalnum() or before == "_") and (after == ":" or after.isspace()):
+            return True
+        i = first_line.find("lambda", i + 1)
+    return False
+
+
+def _is_def_line(line: str) -> bool:
+    """Check if ``line`` starts a ``def``/``async def``, or contains a ``lambda``.
+
+    Hand-written replacement of a regex that backtracked over every decorator line.
+    """
+    stripped = line.lstrip()
+    if stripped.startswith("async") and stripped[5:6].isspace():
+        stripped = stripped[5:].lstrip()
+    if stripped.startswith("def") and stripped[3:4].isspace():
+        return True
+    return "lambda" in line and _contains_lambda(line)
 
 
 class _NoAction(Exception):  # noqa: N818
@@ -44,6 +71,9 @@ def _dedent_tokenizer(code):
 
 
 def _dedent(code):
+    if not code[:1].isspace():
+        # Fast-path: code isn't indented, no need to tokenize.
+        return code
     try:
         return untokenize(_dedent_tokenizer(code))
     except _NoAction:
@@ -82,21 +112,117 @@ def getsource(f, *, strip_signature=False) -> Tuple[str, int, str]:
     src_file: str
         Path to file containing source code.
     """
-    src_file = inspect.getsourcefile(f)
-    if src_file is None:
-        raise FileNotFoundError(f"Unable to get source file for {f}.")
+    func = inspect.unwrap(f)
+    func = getattr(func, "__func__", func)  # Bound methods are created on every attribute access.
+    try:
+        code = func.__code__
+        results = _getsource_cache.setdefault(func, {})
+    except (AttributeError, TypeError):
+        # No code object, or not weak-referenceable.
+        return _getsource(f, strip_signature)
+    try:
+        return results[strip_signature]
+    except KeyError:
+        result = results[strip_signature] = _getsource(code, strip_signature)
+        return result
+
+
+# Maps a function to ``{strip_signature: getsource_result}``.
+# Keyed on the function's identity: code objects compare by value, ignoring e.g. default argument
+# values, so a reloaded function could otherwise hit the stale source of its predecessor.
+_getsource_cache: "weakref.WeakKeyDictionary[Callable, Dict[bool, Tuple[str, int, str]]]" = weakref.WeakKeyDictionary()
+
+
+def _function_defs(lines: List[str]) -> Dict[int, Tuple[str, int, int]]:
+    """Index all function definitions in python source code.
+
+    Parameters
+    ----------
+    lines: List[str]
+        Lines of python source code.
+
+    Returns
+    -------
+    dict
+        Maps a function's first line (its first decorator, if decorated) to
+        ``(name, def_lineno, end_lineno)``.
+    """
+    try:
+        tree = ast.parse("".join(lines))
+    except SyntaxError:
+        return {}
+    index = {}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            first_lineno = min([node.lineno, *(decorator.lineno for decorator in node.decorator_list)])
+            index[first_lineno] = (node.name, node.lineno, node.end_lineno)
+    return index
+
+
+# Maps a source file to its ``(mtime_ns, lines, function_defs)``.
+_source_cache: Dict[str, Tuple[int, List[str], Dict[int, Tuple[str, int, int]]]] = {}
+
+
+def _get_source(src_file: str) -> Tuple[List[str], Dict[int, Tuple[str, int, int]]]:
+    """Get the lines and function index of ``src_file``.
+
+    The file is only re-read and re-parsed if it has been modified since the last call.
+    """
+    try:
+        mtime_ns = Path(src_file).stat().st_mtime_ns
+    except OSError:
+        if src_file not in linecache.cache:
+            raise
+        # Source only lives in ``linecache`` (e.g. Jupyter/IPython cells); nothing on disk to check.
+        lines = linecache.getlines(src_file)
+        return lines, _function_defs(lines)
+    cached = _source_cache.get(src_file)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1], cached[2]
+
+    linecache.checkcache(src_file)
+    lines = linecache.getlines(src_file)
+    function_defs = _function_defs(lines)
+    _source_cache[src_file] = (mtime_ns, lines, function_defs)
+    return lines, function_defs
+
+
+def _getsourcelines(f, src_file: str) -> Tuple[List[str], int]:
+    """Get the source lines of ``f``, starting at the ``def`` line (decorators removed)."""
+    if isinstance(f, CodeType):
+        try:
+            lines, function_defs = _get_source(src_file)
+            name, def_lineno, end_lineno = function_defs[f.co_firstlineno]
+        except (OSError, KeyError):
+            pass
+        else:
+            if name == f.co_name:
+                return lines[def_lineno - 1 : end_lineno], def_lineno
+
+    # Fallback for objects that couldn't be located via the AST (e.g. lambdas).
     lines, src_lineno = inspect.getsourcelines(f)
 
     offset = 0
     for line in lines:
-        if _pat_no_decorators.match(line):
+        if _is_def_line(line):
             break
         offset += 1
 
-    lines = lines[offset:]
+    return lines[offset:], src_lineno + offset
+
+
+def _getsource(f, strip_signature: bool) -> Tuple[str, int, str]:
+    if isinstance(f, CodeType) and f.co_filename in _source_cache:
+        # Already known to be a readable source file; skip ``getsourcefile``'s existence check.
+        # ``_get_source`` still stats it to detect modifications.
+        src_file = f.co_filename
+    else:
+        src_file = inspect.getsourcefile(f)
+    if src_file is None:
+        raise FileNotFoundError(f"Unable to get source file for {f}.")
+    lines, src_lineno = _getsourcelines(f, src_file)
 
     src_code = "".join(lines)
-    src_lineno += offset
 
     src_code = _dedent(src_code)
 
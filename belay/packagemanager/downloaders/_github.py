@@ -1,43 +1,86 @@
 import re
 import shutil
+import threading
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional, Tuple
 
 import git
 import requests
 
 from .common import NonMatchingURI, downloaders
 
+# Serializes access to the cached git clones; dependencies may be downloaded concurrently.
+_git_lock = threading.Lock()
+
+# ``requests.Session`` is not documented as thread-safe and dependencies may be downloaded
+# concurrently, so each thread gets its own session. Consecutive downloads within a thread
+# still reuse the same connection (and TLS handshake).
+_thread_local = threading.local()
+
+_github_url_pattern = re.compile(
+    # Single File Website or Folder; e.g.:
+    #     https://github.com/BrianPugh/belay/blob/main/belay/__init__.py
+    #     https://github.com/BrianPugh/belay/tree/main/belay
+    r"github\.com/(.+?)/(.+?)/(?:blob|tree)/(.+?)/(.*)"
+    # Raw File; e.g.:
+    #     https://raw.githubusercontent.com/BrianPugh/belay/main/belay/__init__.py
+    r"|raw\.githubusercontent\.com/(.+?)/(.+?)/(.+?)/(.*)"
+)
+
+
+def _get_session() -> requests.Session:
+    """Get the calling thread's ``requests.Session``, creating it on first use."""
+    try:
+        return _thread_local.session
+    except AttributeError:
+        _thread_local.session = requests.Session()
+        return _thread_local.session
+
+
+@lru_cache(maxsize=1024)
+def _parse_github_url(uri: str) -> Optional[Tuple[str, str, str, str]]:
+    """Parse a github URI into ``(org, repo, ref, path)``.
+
+    Returns ``None`` if ``uri`` is not a github URI.
+    """
+    match = _github_url_pattern.search(uri)
+    if not match:
+        return None
+    groups = match.groups()
+    return groups[:4] if groups[0] is not None else groups[4:]
+
 
 @downloaders
 def github(dst: Path, uri: str):
     """Download a file or folder from github."""
-    # Single File Website; e.g.:
-    #     https://github.com/BrianPugh/belay/blob/main/belay/__init__.py
-    match = re.search(r"github\.com/(.+?)/(.+?)/blob/(.+?)/(.*)", uri)
-    if not match:
-        # Folder; e.g.:
-        #     https://github.com/BrianPugh/belay/tree/main/belay
-        match = re.search(r"github\.com/(.+?)/(.+?)/tree/(.+?)/(.*)", uri)
-    if not match:
-        match = re.search(r"raw\.githubusercontent\.com/(.+?)/(.+?)/(.+?)/(.*)", uri)
-    if not match:
+    parsed = _parse_github_url(uri)
+    if parsed is None:
         raise NonMatchingURI
-    org, repo, ref, path = match.groups()
+    org, repo, ref, path = parsed
 
     githubusercontent_url = f"https://raw.githubusercontent.com/{org}/{repo}/{ref}/{path}"
 
-    r = requests.get(githubusercontent_url, timeout=10.0)
+    # Stream so that large files are written to disk in chunks, rather than buffered in memory.
+    with _get_session().get(githubusercontent_url, timeout=10.0, stream=True) as r:
+        if r.status_code == 200:
+            # Provided URI is a single file.
+            dst /= Path(path).name
+            with dst.open("wb") as f:
+                for chunk in r.iter_content(chunk_size=65536):
+                    f.write(chunk)
+            return dst
+        elif r.status_code != 404:
+            r.raise_for_status()
+            return dst
+
+    # Probably a folder; use git.
+    from belay.project import find_cache_folder
 
-    if r.status_code == 200:
-        # Provided URI is a single file.
-        dst /= Path(path).name
-        dst.write_bytes(r.content)
-    elif r.status_code == 404:
-        # Probably a folder; use git.
-        from belay.project import find_cache_folder
+    repo_url = f"https://github.com/{org}/{repo}.git"
+    repo_folder = find_cache_folder() / f"git-github-{org}-{repo}"
 
-        repo_url = f"https://github.com/{org}/{repo}.git"
-        repo_folder = find_cache_folder() / f"git-github-{org}-{repo}"
+    with _git_lock:
         repo_folder.mkdir(exist_ok=True, parents=True)
 
         # Check if we have already cloned
@@ -52,7 +95,5 @@ def github(dst: Path, uri: str):
         repo.git.checkout(ref)
 
         shutil.copytree(repo_folder / path, dst, dirs_exist_ok=True)
-    else:
-        r.raise_for_status()
 
     return dst
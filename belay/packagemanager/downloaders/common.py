@@ -38,12 +38,9 @@ def _download_generic(dst: Path, uri: str) -> Path:
     if Path(uri).is_dir():  # local
         shutil.copytree(uri, dst, dirs_exist_ok=True)
     else:
-        with fsspec.open(uri, "rb") as f:
-            data = f.read()
-
         dst /= Path(uri).name
-        with dst.open("wb") as f:
-            f.write(data)
+        with fsspec.open(uri, "rb") as src_f, dst.open("wb") as dst_f:
+            shutil.copyfileobj(src_f, dst_f)
 
     return dst
 
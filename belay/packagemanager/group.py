@@ -1,4 +1,6 @@
 import ast
+import concurrent.futures
+import os
 import shutil
 import tempfile
 from contextlib import nullcontext
@@ -48,17 +50,21 @@ class Group:
         """Delete any dependency module not specified in ``self.config.dependencies``."""
         dependencies = set(self.dependencies)
 
-        if not self.folder.exists():
+        try:
+            it = os.scandir(self.folder)
+        except FileNotFoundError:
             return
 
-        for existing_dep in self.folder.glob("*"):
-            if existing_dep.name in dependencies:
-                continue
+        with it:
+            for entry in it:
+                if entry.name in dependencies:
+                    continue
 
-            if existing_dep.is_dir():
-                shutil.rmtree(existing_dep)
-            else:
-                existing_dep.unlink()
+                # A symlink is unlinked rather than followed; ``shutil.rmtree`` refuses symlinks.
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    Path(entry.path).unlink()
 
     def copy_to(self, dst: PathType) -> None:
         """Copy Dependencies folder to destination directory.
@@ -72,9 +78,12 @@ class Group:
             shutil.copytree(self.folder, dst, dirs_exist_ok=True)
 
         # Copy over any (& overwrite) any dependencies in ``develop`` mode.
+        created_folders = set()
         for package_name, dependency in _walk_develop_dependencies(self.dependencies):
             dst_package_folder = dst / package_name
-            dst_package_folder.mkdir(parents=True, exist_ok=True)
+            if package_name not in created_folders:
+                dst_package_folder.mkdir(parents=True, exist_ok=True)
+                created_folders.add(package_name)
             _download_and_verify_dependency(dst_package_folder, dependency)
 
     def _download_package(self, package_name) -> bool:
@@ -125,10 +134,13 @@ class Group:
             if console:
                 console.print(*args, **kwargs)
 
-        with cm:
-            for package_name in packages:
+        # Downloads are network-latency bound; fetch all packages concurrently.
+        with cm, concurrent.futures.ThreadPoolExecutor(max_workers=min(16, len(packages))) as executor:
+            futures = [executor.submit(self._download_package, package_name) for package_name in packages]
+            # Report in a deterministic order, regardless of completion order.
+            for package_name, future in zip(packages, futures):
                 log(f"  • {package_name}: Updating...", end=" ")
-                changed = self._download_package(package_name)
+                changed = future.result()
                 if changed:
                     log(f"  • [bold green]{package_name}: Updated.")
                 else:
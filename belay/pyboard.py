@@ -676,6 +676,38 @@ class Pyboard:
                     progress_callback(written, src_size)
         self.exec("f.close()")
 
+    def fs_put_many(self, pairs, chunk_size=256, progress_callback=None):
+        """Put multiple files, merging each file's open/close into neighboring transfers.
+
+        Saves two raw-REPL round-trips per file compared to repeatedly calling ``fs_put``.
+
+        Parameters
+        ----------
+        pairs: Iterable[Tuple[Union[str, Path], str]]
+            ``(src, dest)`` pairs to transfer.
+        progress_callback: Callable
+            Called as ``progress_callback(n_completed, dest)`` before each file is transferred.
+        """
+        prefix = ""
+        for i, (src, dest) in enumerate(pairs):
+            if progress_callback:
+                progress_callback(i, dest)
+            # Read up-front so that a local failure can't interrupt an on-device file mid-transfer.
+            try:
+                data = Path(src).read_bytes()
+            except BaseException:
+                # Don't leave the previous on-device file unclosed (and possibly unflushed).
+                if prefix:
+                    self.exec(prefix)
+                raise
+            prefix += f"f=open('{dest}','wb')\nw=f.write\n"
+            for offset in range(0, len(data), chunk_size):
+                self.exec(prefix + "w(" + repr(data[offset : offset + chunk_size]) + ")")
+                prefix = ""
+            prefix += "f.close()\n"
+        if prefix:
+            self.exec(prefix)
+
     def fs_mkdir(self, dir):
         self.exec(f"import uos\nuos.mkdir('{dir}')")
 
@@ -4,3 +4,4 @@ def __belay_next(x, val):
         return x.send(val)
     except StopIteration:
         print("_BELAYS")
+print("_BELAYR" + repr((sys.implementation.name, sys.implementation.version, sys.platform)))
@@ -1,7 +1,8 @@
 # Creates and populates two set[str]: all_files, all_dirs
 def __belay_hfs(fns):
+    # Hashes are packed as fixed-width hex; more compact than repr(list).
     buf = memoryview(bytearray(4096))
-    return [__belay_hf(fn, buf) for fn in fns]
+    return "".join("%08x" % __belay_hf(fn, buf) for fn in fns)
 def __belay_mkdirs(fns):
     for fn in fns:
         try:
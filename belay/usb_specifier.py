@@ -1,4 +1,5 @@
-from typing import Dict, List, Optional
+import time
+from typing import Dict, List, Optional, Tuple
 
 try:
     from pydantic.v1 import BaseModel, Field
@@ -9,6 +10,27 @@ from serial.tools.list_ports import comports
 
 from .exceptions import DeviceNotFoundError, InsufficientSpecifierError
 
+# Enumerating ports is slow (sysfs walk on Linux, SetupDi API on Windows),
+# so results are briefly reused, e.g. when resolving multiple specifiers.
+_COMPORTS_TTL = 0.5
+_comports_cache: Tuple[float, Optional[list]] = (0.0, None)
+
+
+def _comports() -> list:
+    """Cached ``comports()``; results are reused for up to ``_COMPORTS_TTL`` seconds."""
+    global _comports_cache
+    now = time.monotonic()
+    timestamp, ports = _comports_cache
+    if ports is None or now - timestamp > _COMPORTS_TTL:
+        ports = list(comports())
+        _comports_cache = (now, ports)
+    return ports
+
+
+def _comports_cache_clear() -> None:
+    global _comports_cache
+    _comports_cache = (0.0, None)
+
 
 def _normalize(val):
     """Normalize ``val`` for comparison."""
@@ -87,6 +109,6 @@ def list_devices() -> List[UsbSpecifier]:
             location=port.location,
             device=port.device,
         )
-        for port in comports()
+        for port in _comports()
     ]
     return [x for x in devices if x.populated()]
@@ -9,6 +9,7 @@ from typer.testing import CliRunner
 import belay
 import belay.cli.common
 import belay.project
+import belay.usb_specifier
 from belay.cli import app
 from belay.utils import env_parse_bool
 
@@ -38,6 +39,7 @@ def cache_clear():
     belay.project.load_pyproject.cache_clear()
     belay.project.load_toml.cache_clear()
     belay.project.load_groups.cache_clear()
+    belay.usb_specifier._comports_cache_clear()
 
 
 @pytest.fixture(autouse=True)
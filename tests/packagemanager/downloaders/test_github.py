@@ -1,6 +1,9 @@
+import threading
+
 import pytest
 
 from belay.packagemanager import downloaders
+from belay.packagemanager.downloaders._github import _get_session, _parse_github_url
 
 
 @pytest.mark.network
@@ -25,3 +28,53 @@ def test_download_github_single(tmp_path):
     downloaders.github(tmp_path, uri)
 
     assert (tmp_path / "file1.py").read_text() == 'print("belay test file for downloading.")\n'
+
+
+@pytest.mark.parametrize(
+    "uri",
+    [
+        "https://github.com/BrianPugh/belay/blob/main/tests/github_download_folder/file1.py",
+        "https://raw.githubusercontent.com/BrianPugh/belay/main/tests/github_download_folder/file1.py",
+    ],
+)
+def test_parse_github_url_file(uri):
+    assert _parse_github_url(uri) == ("BrianPugh", "belay", "main", "tests/github_download_folder/file1.py")
+
+
+def test_parse_github_url_folder():
+    uri = "https://github.com/BrianPugh/belay/tree/main/tests/github_download_folder"
+    assert _parse_github_url(uri) == ("BrianPugh", "belay", "main", "tests/github_download_folder")
+
+
+def test_parse_github_url_non_matching():
+    assert _parse_github_url("https://example.com/foo.py") is None
+
+
+def test_download_github_single_streamed(mocker, tmp_path):
+    response = mocker.MagicMock(status_code=200)
+    response.__enter__.return_value = response
+    response.iter_content.return_value = [b"print(", b'"hello")\n']
+    mock_get = mocker.patch("belay.packagemanager.downloaders._github._get_session").return_value.get
+    mock_get.return_value = response
+
+    uri = "https://github.com/BrianPugh/belay/blob/main/tests/github_download_folder/file1.py"
+    actual = downloaders.github(tmp_path, uri)
+
+    mock_get.assert_called_once_with(
+        "https://raw.githubusercontent.com/BrianPugh/belay/main/tests/github_download_folder/file1.py",
+        timeout=10.0,
+        stream=True,
+    )
+    assert actual == tmp_path / "file1.py"
+    assert actual.read_text() == 'print("hello")\n'
+
+
+def test_get_session_per_thread():
+    session = _get_session()
+    assert _get_session() is session
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(_get_session()))
+    thread.start()
+    thread.join()
+    assert other[0] is not session
@@ -5,18 +5,17 @@ import belay.device
 from belay import Device
 from belay.exceptions import NoMatchingExecuterError
 
+_IMPLEMENTATION_RESPONSE = b'_BELAYR("micropython", (1, 19, 1), "rp2")\r\n'
+
 
 @pytest.fixture
 def mock_pyboard(mocker):
-    exec_side_effect = [b'_BELAYR("micropython", (1, 19, 1), "rp2")\r\n'] * 100
-
     def mock_init(self, *args, **kwargs):
         self.serial = mocker.MagicMock()
 
     def mock_exec(cmd, data_consumer=None):
-        data = exec_side_effect.pop()
         if data_consumer:
-            data_consumer(data)
+            data_consumer(_IMPLEMENTATION_RESPONSE)
 
     mocker.patch.object(belay.device.Pyboard, "__init__", mock_init)
     mocker.patch.object(belay.device.Pyboard, "exec", side_effect=mock_exec)
@@ -38,6 +37,35 @@ def test_device_init_no_startup(mock_pyboard):
     belay.Device(startup="")
 
 
+def test_device_init_round_trips(mock_pyboard):
+    device = belay.Device(startup="")
+    # Startup snippet + implementation query, then emitter check.
+    assert device._board.exec.call_count == 2
+    assert device.implementation.name == "micropython"
+    assert device.implementation.version == (1, 19, 1)
+    assert device.implementation.platform == "rp2"
+
+
+def test_device_exec_snippet_loaded_once(mock_device):
+    mock_device._board.exec.reset_mock()
+    mock_device._exec_snippet("sync_begin")
+    mock_device._exec_snippet("sync_begin")
+    assert mock_device._board.exec.call_count == 1
+
+    # Only the snippets that haven't been loaded yet are sent.
+    mock_device._exec_snippet("sync_begin", "hf")
+    assert mock_device._board.exec.call_count == 2
+    assert "__belay_hfs" not in mock_device._board.exec.call_args.args[0]
+
+    # Device globals are cleared by a soft reset.
+    mock_device._board.exit_raw_repl = lambda: None
+    mock_device._board.read_until = lambda *args: None
+    mock_device._board.ctrl_d = lambda: None
+    mock_device.soft_reset()
+    mock_device._exec_snippet("sync_begin")
+    assert mock_device._board.exec.call_count == 3
+
+
 def test_device_task(mocker, mock_device):
     mock_device._traceback_execute = mocker.MagicMock()
 
@@ -1,4 +1,9 @@
+import json
 import os
+import re
+import tempfile
+import time
+from functools import lru_cache
 from pathlib import Path
 from unittest.mock import call
 
@@ -7,6 +12,7 @@ import pytest
 import belay
 import belay.device
 import belay.device_sync_support as device_sync_support
+import belay.pyboard
 
 
 def uint(x):
@@ -20,22 +26,29 @@ def __belay_ilistdir(x):
         yield (name, stat.st_mode, stat.st_ino)
 
 
+@pytest.fixture(autouse=True)
+def tmp_cache_folder(tmp_path_factory, mocker):
+    cache_folder = tmp_path_factory.mktemp("cache")
+    mocker.patch("belay.project.find_cache_folder", return_value=cache_folder)
+    return cache_folder
+
+
+_IMPLEMENTATION_RESPONSE = b'_BELAYR("micropython", (1, 19, 1), "rp2")\r\n'
+
+
 @pytest.fixture
 def mock_pyboard(mocker):
     def mock_init(self, *args, **kwargs):
         self.serial = mocker.MagicMock()
 
-    exec_side_effect = [b'_BELAYR("micropython", (1, 19, 1), "rp2")\r\n'] * 100
-
     def mock_exec(cmd, data_consumer=None):
-        data = exec_side_effect.pop()
         if data_consumer:
-            data_consumer(data)
+            data_consumer(_IMPLEMENTATION_RESPONSE)
 
     mocker.patch.object(belay.device.Pyboard, "__init__", mock_init)
     mocker.patch.object(belay.device.Pyboard, "exec", side_effect=mock_exec)
     mocker.patch("belay.device.Pyboard.enter_raw_repl", return_value=None)
-    mocker.patch("belay.device.Pyboard.fs_put")
+    mocker.patch("belay.device.Pyboard.fs_put_many")
 
 
 @pytest.fixture
@@ -57,41 +70,41 @@ def sync_path(tmp_path):
     return tmp_path
 
 
+_micropython_line_pattern = re.compile(r"^.*micropython.*\n?", re.MULTILINE)
+
+
 def _patch_micropython_code(snippet):
     # Patch out micropython stuff
-    lines = snippet.split("\n")
-    lines = [x for x in lines if "micropython" not in x]
-    snippet = "\n".join(lines)
+    snippet = _micropython_line_pattern.sub("", snippet)
     snippet = snippet.replace("os.ilistdir", "ilistdir")
     return snippet
 
 
+@lru_cache(maxsize=None)
+def _compiled_snippet(name):
+    snippet = belay.device.read_snippet(name)
+    snippet = _patch_micropython_code(snippet)
+    return compile(snippet, f"<snippet:{name}>", "exec")
+
+
 @pytest.fixture
 def sync_begin():
-    snippet = belay.device.read_snippet("sync_begin")
-    snippet = _patch_micropython_code(snippet)
-    exec(snippet, globals())
+    exec(_compiled_snippet("sync_begin"), globals())
 
 
 @pytest.fixture
 def hf():
-    snippet = belay.device.read_snippet("hf")
-    snippet = _patch_micropython_code(snippet)
-    exec(snippet, globals())
+    exec(_compiled_snippet("hf"), globals())
 
 
 @pytest.fixture
 def hf_native():
-    snippet = belay.device.read_snippet("hf_native")
-    snippet = _patch_micropython_code(snippet)
-    exec(snippet, globals())
+    exec(_compiled_snippet("hf_native"), globals())
 
 
 @pytest.fixture
 def hf_viper():
-    snippet = belay.device.read_snippet("hf_viper")
-    snippet = _patch_micropython_code(snippet)
-    exec(snippet, globals())
+    exec(_compiled_snippet("hf_viper"), globals())
 
 
 def test_sync_device_belay_hf(hf, tmp_path):
@@ -129,7 +142,8 @@ def test_sync_device_belay_hfs(sync_begin, capsys, tmp_path):
     foobar_file.write_text("foobar")
 
     return_value = __belay_hfs([str(fooba_file), str(foobar_file)])  # noqa: F821
-    assert return_value == [0x39AAA18A, 0xBF9CF968]
+    assert return_value == "39aaa18abf9cf968"
+    assert device_sync_support.parse_hashes(return_value) == [0x39AAA18A, 0xBF9CF968]
 
 
 def test_sync_device_belay_mkdirs(sync_begin, tmp_path):
@@ -156,7 +170,7 @@ def test_sync_device_belay_fs_does_not_exist(sync_begin, tmp_path):
 
 
 def test_device_sync_empty_remote(mocker, mock_device, sync_path):
-    exec_side_effect = ("_BELAYR" + repr([b""] * 5) + "\r\n").encode("utf-8")
+    exec_side_effect = ("_BELAYR" + repr("00000000" * 5) + "\r\n").encode("utf-8")
 
     def mock_exec(cmd, data_consumer=None):
         data_consumer(exec_side_effect)
@@ -178,18 +192,67 @@ def test_device_sync_empty_remote(mocker, mock_device, sync_path):
         ]
     )
 
-    mock_device._board.fs_put.assert_has_calls(
+    mock_device._board.fs_put_many.assert_called_once()
+    puts = mock_device._board.fs_put_many.call_args.args[0]
+    # "alpha.py" gets minified into a temporary directory.
+    assert puts[0][1] == "/alpha.py"
+    assert puts[1:] == [
+        (sync_path / "bar.txt", "/bar.txt"),
+        (sync_path / "folder1/file1.txt", "/folder1/file1.txt"),
+        (
+            sync_path / "folder1/folder1_1/file1_1.txt",
+            "/folder1/folder1_1/file1_1.txt",
+        ),
+        (sync_path / "foo.txt", "/foo.txt"),
+    ]
+
+
+def test_pyboard_fs_put_many(mocker, tmp_path):
+    (tmp_path / "foo.txt").write_text("foo contents")
+    (tmp_path / "empty.txt").touch()
+    (tmp_path / "bar.txt").write_text("bar contents")
+
+    pyboard = belay.pyboard.Pyboard.__new__(belay.pyboard.Pyboard)
+    pyboard.exec = mocker.MagicMock()
+
+    pyboard.fs_put_many(
         [
-            call(sync_path / "bar.txt", "/bar.txt"),
-            call(sync_path / "folder1/file1.txt", "/folder1/file1.txt"),
-            call(
-                sync_path / "folder1/folder1_1/file1_1.txt",
-                "/folder1/folder1_1/file1_1.txt",
-            ),
-            call(sync_path / "foo.txt", "/foo.txt"),
+            (tmp_path / "foo.txt", "/foo.txt"),
+            (tmp_path / "empty.txt", "/empty.txt"),
+            (tmp_path / "bar.txt", "/bar.txt"),
         ]
     )
 
+    assert pyboard.exec.call_args_list == [
+        call("f=open('/foo.txt','wb')\nw=f.write\nw(b'foo contents')"),
+        call(
+            "f.close()\nf=open('/empty.txt','wb')\nw=f.write\nf.close()\n"
+            "f=open('/bar.txt','wb')\nw=f.write\nw(b'bar contents')"
+        ),
+        call("f.close()\n"),
+    ]
+
+
+def test_pyboard_fs_put_many_read_error(mocker, tmp_path):
+    (tmp_path / "foo.txt").write_text("foo contents")
+
+    pyboard = belay.pyboard.Pyboard.__new__(belay.pyboard.Pyboard)
+    pyboard.exec = mocker.MagicMock()
+
+    with pytest.raises(FileNotFoundError):
+        pyboard.fs_put_many(
+            [
+                (tmp_path / "foo.txt", "/foo.txt"),
+                (tmp_path / "missing.txt", "/missing.txt"),
+            ]
+        )
+
+    # The previous file is still closed, and the missing file is never opened on-device.
+    assert pyboard.exec.call_args_list == [
+        call("f=open('/foo.txt','wb')\nw=f.write\nw(b'foo contents')"),
+        call("f.close()\n"),
+    ]
+
 
 def test_device_sync_partial_remote(mocker, mock_device, sync_path):
     def __belay_hfs(fns):
@@ -197,10 +260,10 @@ def test_device_sync_partial_remote(mocker, mock_device, sync_path):
         for fn in fns:
             local_fn = sync_path / fn[1:]
             if local_fn.stem.endswith("1"):
-                out.append(0)
+                out.append("00000000")
             else:
-                out.append(device_sync_support.fnv1a(local_fn))
-        return out
+                out.append(f"{device_sync_support.fnv1a(local_fn):08x}")
+        return "".join(out)
 
     def mock_exec(cmd, data_consumer=None):
         if cmd.startswith("print('_BELAYR' + repr(__belay_hfs"):
@@ -223,15 +286,143 @@ def test_device_sync_partial_remote(mocker, mock_device, sync_path):
 
     mock_device.sync(sync_path)
 
-    mock_device._board.fs_put.assert_has_calls(
-        [
-            call(sync_path / "folder1/file1.txt", "/folder1/file1.txt"),
-            call(
-                sync_path / "folder1/folder1_1/file1_1.txt",
-                "/folder1/folder1_1/file1_1.txt",
-            ),
-        ]
+    mock_device._board.fs_put_many.assert_called_once()
+    puts = mock_device._board.fs_put_many.call_args.args[0]
+    # "alpha.py" gets minified into a temporary directory.
+    assert puts[0][1] == "/alpha.py"
+    assert puts[1:] == [
+        (sync_path / "folder1/file1.txt", "/folder1/file1.txt"),
+        (
+            sync_path / "folder1/folder1_1/file1_1.txt",
+            "/folder1/folder1_1/file1_1.txt",
+        ),
+    ]
+
+
+def test_device_sync_hash_cache(mocker, mock_device, sync_path):
+    exec_side_effect = ("_BELAYR" + repr("00000000" * 5) + "\r\n").encode("utf-8")
+
+    def mock_exec(cmd, data_consumer=None):
+        data_consumer(exec_side_effect)
+
+    mocker.patch.object(belay.device.Pyboard, "exec", side_effect=mock_exec)
+    # ``sync_path`` lives in the system temporary directory.
+    mocker.patch("belay.device_sync_support._is_temporary", return_value=False)
+    spy_fnv1a = mocker.spy(device_sync_support, "fnv1a")
+
+    # Backdate files so they can't be "racy" with respect to the cache's write time.
+    old_time = time.time() - 60
+    for src_file in sync_path.rglob("*"):
+        os.utime(src_file, (old_time, old_time))
+
+    mock_device.sync(sync_path)
+    assert spy_fnv1a.call_count == 5
+    assert device_sync_support._hash_cache_path(sync_path).exists()
+
+    spy_fnv1a.reset_mock()
+    mock_device.sync(sync_path)
+    spy_fnv1a.assert_not_called()
+    # Files are still transferred since the (mocked) remote hashes differ.
+    assert len(mock_device._board.fs_put_many.call_args.args[0]) == 5
+
+    (sync_path / "bar.txt").write_text("new bar contents")
+    spy_fnv1a.reset_mock()
+    mock_device.sync(sync_path)
+    spy_fnv1a.assert_called_once()
+
+
+def test_hash_cache_racy_entry(tmp_path, mocker):
+    mocker.patch("belay.device_sync_support._is_temporary", return_value=False)
+    src_file = tmp_path / "foo.txt"
+    src_file.write_text("foo contents")
+    hash_cache = device_sync_support.load_hash_cache(tmp_path)
+    device_sync_support.preprocess_src_file_hash(tmp_path / "out", src_file, False, None, hash_cache)
+
+    # Entry was recorded no earlier than the cache was written; it must be re-hashed.
+    hash_cache["written_ns"] = src_file.stat().st_mtime_ns
+    preprocessed_file, _ = device_sync_support.preprocess_src_file_hash(
+        tmp_path / "out", src_file, False, None, hash_cache
+    )
+    assert preprocessed_file == src_file
+
+    hash_cache["written_ns"] = src_file.stat().st_mtime_ns + 1
+    preprocessed_file, _ = device_sync_support.preprocess_src_file_hash(
+        tmp_path / "out", src_file, False, None, hash_cache
     )
+    assert preprocessed_file is None
+
+
+def test_hash_cache_temporary_folder(tmp_path, tmp_cache_folder):
+    assert device_sync_support.load_hash_cache(Path(tempfile.gettempdir()).resolve() / "foo") is None
+    device_sync_support.save_hash_cache(tmp_path, None)
+    assert not (tmp_cache_folder / "sync-hashes").exists()
+
+
+def test_hash_cache_path_per_folder(tmp_cache_folder):
+    assert device_sync_support._hash_cache_path(Path("/foo")) != device_sync_support._hash_cache_path(Path("/bar"))
+    assert device_sync_support._hash_cache_path(Path("/foo")).parent == tmp_cache_folder / "sync-hashes"
+
+
+@pytest.mark.parametrize(
+    "contents",
+    [
+        "[]",
+        "not json",
+        json.dumps({"{src_file}": []}),
+        json.dumps({"{src_file}": {"0": [1, 2]}}),
+        json.dumps({"{src_file}": {"0": [1, 2, "3"]}}),
+    ],
+)
+def test_hash_cache_malformed(tmp_path, mocker, contents):
+    mocker.patch("belay.device_sync_support._is_temporary", return_value=False)
+    src_file = tmp_path / "foo.txt"
+    src_file.write_text("foo contents")
+    path = device_sync_support._hash_cache_path(tmp_path)
+    path.parent.mkdir(parents=True)
+    path.write_text(contents.replace("{src_file}", json.dumps(str(src_file))[1:-1]))
+
+    hash_cache = device_sync_support.load_hash_cache(tmp_path)
+    preprocessed_file, src_hash = device_sync_support.preprocess_src_file_hash(
+        tmp_path / "out", src_file, False, None, hash_cache
+    )
+    assert preprocessed_file == src_file
+    assert src_hash == device_sync_support.fnv1a(src_file)
+    device_sync_support.save_hash_cache(tmp_path, hash_cache)
+
+
+def test_hash_cache_unusable_cache_folder(tmp_path, tmp_cache_folder, mocker):
+    # e.g. ``~/.cache`` is a regular file.
+    mocker.patch("belay.project.find_cache_folder", return_value=tmp_cache_folder / "file" / "belay")
+    (tmp_cache_folder / "file").touch()
+    mocker.patch("belay.device_sync_support._is_temporary", return_value=False)
+
+    assert device_sync_support.load_hash_cache(tmp_path) is None
+    # Saving a fresh cache must not raise either.
+    device_sync_support.save_hash_cache(tmp_path, {"written_ns": 0, "files": {}})
+
+
+def test_save_hash_cache_prunes_old_roots(tmp_path, tmp_cache_folder, mocker):
+    mocker.patch("belay.device_sync_support._is_temporary", return_value=False)
+    old = device_sync_support._hash_cache_path(tmp_path / "old")
+    old.parent.mkdir(parents=True)
+    old.write_text("{}")
+    old_time = time.time() - device_sync_support._CACHE_MAX_AGE - 60
+    os.utime(old, (old_time, old_time))
+
+    device_sync_support.save_hash_cache(tmp_path, device_sync_support.load_hash_cache(tmp_path))
+
+    assert not old.exists()
+    assert device_sync_support._hash_cache_path(tmp_path).exists()
+
+
+def test_mpy_cross_identity(tmp_path):
+    binary = tmp_path / "mpy-cross"
+    binary.write_bytes(b"v1")
+    first = device_sync_support.mpy_cross_identity(binary)
+    assert first.startswith(str(binary))
+
+    binary.write_bytes(b"v1.1")
+    assert device_sync_support.mpy_cross_identity(binary) != first
 
 
 def test_discover_files_dirs_dir(tmp_path):
@@ -328,6 +519,25 @@ def test_discover_files_dirs_dir_ignore_folder(tmp_path):
     ]
 
 
+def test_discover_files_dirs_dir_ignore_negation(tmp_path):
+    (tmp_path / "file1.ext").touch()
+    (tmp_path / "file2.pyc").touch()
+    (tmp_path / "keep.pyc").touch()
+
+    src_files, src_dirs, dst_files = belay.device.discover_files_dirs(
+        remote_dir="/foo/bar",
+        local_file_or_folder=tmp_path,
+        ignore=["*.pyc", "!keep.pyc"],
+    )
+
+    src_files = [x.relative_to(tmp_path) for x in src_files]
+    assert src_files == [
+        Path("file1.ext"),
+        Path("keep.pyc"),
+    ]
+    assert src_dirs == []
+
+
 def test_discover_files_dirs_empty(tmp_path):
     remote_dir = "/foo/bar"
     src_files, src_dirs, dst_files = belay.device.discover_files_dirs(
@@ -430,10 +640,114 @@ def test_preprocess_src_file_cross_mpy_relative(tmp_path, mocker):
     assert call[0] == "fake-mpy-cross-binary"
     assert call[1] == "-o"
     assert call[2].as_posix().endswith("foo/bar/baz.mpy")
-    assert call[3].as_posix().endswith("foo/bar/baz.py")
+    assert call[3:5] == ["-s", "foo/bar/baz.py"]
+    assert call[5].as_posix().endswith("foo/bar/baz.py")
     assert actual.as_posix().endswith("foo/bar/baz.mpy")
 
 
+def test_preprocess_src_file_cross_mpy_cached(tmp_path, mocker):
+    def fake_mpy_cross(cmd):
+        cmd[2].write_bytes(b"M" + cmd[5].read_bytes())
+
+    mock_check_output = mocker.patch(
+        "belay.device_sync_support.subprocess.check_output",
+        side_effect=fake_mpy_cross,
+    )
+    src_file = tmp_path / "src" / "foo.py"
+    src_file.parent.mkdir()
+    src_file.write_text("a = 1\n")
+
+    first = device_sync_support.preprocess_src_file(tmp_path / "first", src_file, False, "fake-mpy-cross-binary")
+    second = device_sync_support.preprocess_src_file(tmp_path / "second", src_file, False, "fake-mpy-cross-binary")
+    mock_check_output.assert_called_once()
+    assert first != second
+    assert second.read_bytes() == first.read_bytes() == b"Ma = 1\n"
+
+    # Modified source must be recompiled.
+    src_file.write_text("a = 2\n")
+    third = device_sync_support.preprocess_src_file(tmp_path / "third", src_file, False, "fake-mpy-cross-binary")
+    assert mock_check_output.call_count == 2
+    assert third.read_bytes() == b"Ma = 2\n"
+
+
+def test_preprocess_src_file_cross_mpy_cached_source_name(tmp_path, mocker):
+    def fake_mpy_cross(cmd):
+        cmd[2].write_bytes(cmd[4].encode() + cmd[5].read_bytes())
+
+    mock_check_output = mocker.patch(
+        "belay.device_sync_support.subprocess.check_output",
+        side_effect=fake_mpy_cross,
+    )
+    for root in ("root1", "root2"):
+        src_file = tmp_path / root / "foo.py"
+        src_file.parent.mkdir()
+        src_file.write_text("a = 1\n")
+
+    # Same contents and source name from different roots (e.g. ``belay install`` temporary folders) share the cache.
+    first = device_sync_support.preprocess_src_file(
+        tmp_path / "first", tmp_path / "root1" / "foo.py", False, "fake-mpy-cross-binary", "foo.py"
+    )
+    second = device_sync_support.preprocess_src_file(
+        tmp_path / "second", tmp_path / "root2" / "foo.py", False, "fake-mpy-cross-binary", "foo.py"
+    )
+    mock_check_output.assert_called_once()
+    assert first.read_bytes() == second.read_bytes() == b"foo.pya = 1\n"
+
+    # A different source name is embedded in the output, so it must be recompiled.
+    third = device_sync_support.preprocess_src_file(
+        tmp_path / "third", tmp_path / "root1" / "foo.py", False, "fake-mpy-cross-binary", "lib/foo.py"
+    )
+    assert mock_check_output.call_count == 2
+    assert third.read_bytes() == b"lib/foo.pya = 1\n"
+
+
+def test_prune_mpy_cache(tmp_cache_folder):
+    cache_folder = device_sync_support._mpy_cache_folder()
+    cache_folder.mkdir()
+    old = cache_folder / "old.mpy"
+    new = cache_folder / "new.mpy"
+    old.write_bytes(b"old")
+    new.write_bytes(b"new")
+    old_time = time.time() - device_sync_support._CACHE_MAX_AGE - 60
+    os.utime(old, (old_time, old_time))
+
+    device_sync_support.prune_mpy_cache()
+
+    assert not old.exists()
+    assert new.exists()
+
+
+def test_prune_mpy_cache_unlink_error(tmp_cache_folder, mocker):
+    cache_folder = device_sync_support._mpy_cache_folder()
+    cache_folder.mkdir()
+    old = cache_folder / "old.mpy"
+    old.write_bytes(b"old")
+    old_time = time.time() - device_sync_support._CACHE_MAX_AGE - 60
+    os.utime(old, (old_time, old_time))
+    mocker.patch.object(Path, "unlink", side_effect=PermissionError)
+
+    device_sync_support.prune_mpy_cache()
+
+    assert old.exists()
+
+
+def test_preprocess_src_file_cross_mpy_cache_write_error(tmp_path, mocker):
+    def fake_mpy_cross(cmd):
+        cmd[2].write_bytes(b"M" + cmd[5].read_bytes())
+
+    mocker.patch("belay.device_sync_support.subprocess.check_output", side_effect=fake_mpy_cross)
+    mocker.patch("belay.device_sync_support._write_bytes_atomic", side_effect=OSError(28, "No space left on device"))
+    src_file = tmp_path / "foo.py"
+    src_file.write_text("a = 1\n")
+
+    actual = device_sync_support.preprocess_src_file(tmp_path / "out", src_file, False, "fake-mpy-cross-binary")
+    assert actual.read_bytes() == b"Ma = 1\n"
+
+
+def test_prune_mpy_cache_missing_folder(tmp_cache_folder):
+    device_sync_support.prune_mpy_cache()
+
+
 @pytest.mark.skipif(os.name != "nt", reason="Runs only on Windows")
 def test_preprocess_src_file_cross_mpy_absolute(mocker):
     mock_check_output = mocker.patch("belay.device_sync_support.subprocess.check_output")
@@ -448,7 +762,8 @@ def test_preprocess_src_file_cross_mpy_absolute(mocker):
     assert call[0] == "fake-mpy-cross-binary"
     assert call[1] == "-o"
     assert call[2].as_posix() == "C:/tmp/abc123/foo/bar/baz.mpy"
-    assert call[3].as_posix() == "D:/foo/bar/baz.py"
+    assert call[3:5] == ["-s", "D:/foo/bar/baz.py"]
+    assert call[5].as_posix() == "D:/foo/bar/baz.py"
     assert actual.as_posix() == "C:/tmp/abc123/foo/bar/baz.mpy"
 
 
@@ -4,17 +4,26 @@ Note: ``untokenize`` doesn't properly preserve inter-token spacing, so this test
 may need to change while still remaining valid.
 """
 
+import importlib
+import linecache
+import os
+import shutil
+import sys
 import types
 import pytest
 
 from importlib.machinery import SourceFileLoader
+from pathlib import Path
 
 import belay.inspect
 
 
-@pytest.fixture
-def foo(data_path):
-    fn = data_path / "foo.py"
+@pytest.fixture(scope="module")
+def foo(tmp_path_factory):
+    # Module-scoped; tests only read from it, so it's copied & loaded once.
+    # Loaded from a copy so bytecode isn't written into the shared test data folder.
+    fn = tmp_path_factory.mktemp("test_inspect") / "foo.py"
+    shutil.copyfile(Path(__file__).parent / "test_inspect" / "foo.py", fn)
     module_name = "foo"
     # Create a new module object
     foo = types.ModuleType(module_name)
@@ -25,23 +34,23 @@ def foo(data_path):
     return foo
 
 
-def test_getsource_pattern_match():
-    pat = belay.inspect._pat_no_decorators
-    assert not pat.match("@device.task")
-    assert not pat.match("@device.task()")
-    assert not pat.match("@device.task(")
-    assert not pat.match("")
-    assert not pat.match("\n")
+def test_is_def_line():
+    is_def_line = belay.inspect._is_def_line
+    assert not is_def_line("@device.task")
+    assert not is_def_line("@device.task()")
+    assert not is_def_line("@device.task(")
+    assert not is_def_line("")
+    assert not is_def_line("\n")
 
-    assert pat.match("def foo")
-    assert pat.match("def foo()")
-    assert pat.match("def foo(")
-    assert pat.match("def foo(\n\n")
+    assert is_def_line("def foo")
+    assert is_def_line("def foo()")
+    assert is_def_line("def foo(")
+    assert is_def_line("def foo(\n\n")
 
-    assert pat.match("async def foo")
-    assert pat.match("async def foo()")
-    assert pat.match("async def foo(")
-    assert pat.match("async def foo(\n\n")
+    assert is_def_line("async def foo")
+    assert is_def_line("async def foo()")
+    assert is_def_line("async def foo(")
+    assert is_def_line("async def foo(\n\n")
 
 
 def test_getsource_basic(foo):
@@ -210,6 +219,93 @@ arg1,
     assert file == __file__
 
 
+def test_getsource_cached(foo, mocker):
+    belay.inspect._getsource_cache.clear()
+    spy_getsourcelines = mocker.spy(belay.inspect, "_getsourcelines")
+    first = belay.inspect.getsource(foo.foo_decorated_2)
+    second = belay.inspect.getsource(foo.foo_decorated_2)
+    assert first == second
+    spy_getsourcelines.assert_called_once()
+
+
+def test_getsource_parses_file_once(foo, mocker):
+    belay.inspect._getsource_cache.clear()
+    belay.inspect._source_cache.clear()
+    spy_parse = mocker.spy(belay.inspect.ast, "parse")
+    spy_getsourcelines = mocker.spy(belay.inspect.inspect, "getsourcelines")
+    belay.inspect.getsource(foo.foo_decorated_1)
+    belay.inspect.getsource(foo.foo_decorated_4)
+    belay.inspect.getsource(foo.foo_decorated_6)
+    spy_parse.assert_called_once()
+    spy_getsourcelines.assert_not_called()
+
+
+def test_getsource_skips_getsourcefile_when_cached(foo, mocker):
+    belay.inspect._getsource_cache.clear()
+    belay.inspect.getsource(foo.foo_decorated_1)
+    spy_getsourcefile = mocker.spy(belay.inspect.inspect, "getsourcefile")
+    code, lineno, file = belay.inspect.getsource(foo.foo_decorated_2)
+    spy_getsourcefile.assert_not_called()
+    assert code == "def foo_decorated_2(arg1, arg2):\n    return arg1 + arg2\n"
+    assert file == foo.__file__
+
+
+def test_getsource_file_modified(tmp_path):
+    fn = tmp_path / "bar.py"
+    fn.write_text("def bar():\n    return 1\n")
+    code, lineno, file = belay.inspect._getsource(compile(fn.read_text(), str(fn), "exec").co_consts[0], False)
+    assert code == "def bar():\n    return 1\n"
+
+    fn.write_text("def bar():\n    return 2\n")
+    os.utime(fn, ns=(0, fn.stat().st_mtime_ns + 1_000_000_000))
+    code, lineno, file = belay.inspect._getsource(compile(fn.read_text(), str(fn), "exec").co_consts[0], False)
+    assert code == "def bar():\n    return 2\n"
+
+
+def test_getsource_reloaded(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(sys, "dont_write_bytecode", True)
+    fn = tmp_path / "belay_test_reload.py"
+    fn.write_text("def f(x=1):\n    return x\n")
+    module = importlib.import_module("belay_test_reload")
+    try:
+        code, lineno, file = belay.inspect.getsource(module.f)
+        assert code == "def f(x=1):\n    return x\n"
+
+        # Same code object value; only the (enclosing-scope evaluated) default differs.
+        fn.write_text("def f(x=2):\n    return x\n")
+        os.utime(fn, ns=(0, fn.stat().st_mtime_ns + 1_000_000_000))
+        module = importlib.reload(module)
+        code, lineno, file = belay.inspect.getsource(module.f)
+        assert code == "def f(x=2):\n    return x\n"
+    finally:
+        sys.modules.pop("belay_test_reload", None)
+
+
+def test_getsource_linecache_only(mocker):
+    # Mimics how IPython/Jupyter registers cell source code.
+    src_file = "<belay-test-cell>"
+    src = "@decorator\ndef foo(arg1, arg2):\n    return arg1 + arg2\n"
+    mocker.patch.dict(linecache.cache, {src_file: (len(src), None, src.splitlines(True), src_file)})
+    namespace = {"decorator": lambda f: f}
+    exec(compile(src, src_file, "exec"), namespace)
+
+    spy_getsourcelines = mocker.spy(belay.inspect.inspect, "getsourcelines")
+    code, lineno, file = belay.inspect.getsource(namespace["foo"])
+    assert code == "def foo(arg1, arg2):\n    return arg1 + arg2\n"
+    assert lineno == 2
+    assert file == src_file
+    spy_getsourcelines.assert_not_called()
+
+
+def test_getsource_lambda():
+    f = lambda x: x + 1  # noqa: E731
+    code, lineno, file = belay.inspect.getsource(f)
+    assert "lambda x" in code
+    assert lineno == f.__code__.co_firstlineno
+    assert file == __file__
+
+
 def test_isexpression_basic():
     assert belay.inspect.isexpression("") == False
 
@@ -3,7 +3,7 @@ from typing import Optional
 
 import pytest
 
-from belay import UsbSpecifier
+from belay import UsbSpecifier, list_devices
 from belay.exceptions import DeviceNotFoundError, InsufficientSpecifierError
 
 
@@ -63,3 +63,11 @@ def test_usb_specifier_no_matches(mock_comports):
 def test_usb_specifier_multiple_matches(mock_comports):
     with pytest.raises(InsufficientSpecifierError):
         UsbSpecifier(manufacturer="Belay Industries").to_port()
+
+
+def test_list_devices_comports_cached(mock_comports):
+    first = list_devices()
+    second = list_devices()
+    mock_comports.assert_called_once()
+    assert first == second
+    assert len(first) == 2